@@ -1,9 +1,11 @@
-from typing import NamedTuple, List
+from dataclasses import dataclass
+from typing import List
 
 # ---------------------------------------------------------------------
 # BBox Definitions (min_lat, min_lon, max_lat, max_lon)
 # ---------------------------------------------------------------------
-class BBox(NamedTuple):
+@dataclass(frozen=True, slots=True)
+class BBox:
     min_lat: float
     min_lon: float
     max_lat: float
@@ -17,15 +19,14 @@ AUSTRIA_BBOX = BBox(46.372652, 9.530952, 49.017078, 17.16058)
 
 def split_bbox(bbox: BBox, divider: int) -> List[BBox]:
     """Split a BBox into divider x divider evenly sized chunks."""
-    lat_step = (bbox.max_lat - bbox.min_lat) / divider
-    lon_step = (bbox.max_lon - bbox.min_lon) / divider
+    min_lat, min_lon = bbox.min_lat, bbox.min_lon
+    lat_step = (bbox.max_lat - min_lat) / divider
+    lon_step = (bbox.max_lon - min_lon) / divider
+    # Edges are computed once and shared by neighbouring chunks
+    lats = [min_lat + i * lat_step for i in range(divider + 1)]
+    lons = [min_lon + j * lon_step for j in range(divider + 1)]
     return [
-        BBox(
-            bbox.min_lat + i * lat_step,
-            bbox.min_lon + j * lon_step,
-            bbox.min_lat + (i + 1) * lat_step,
-            bbox.min_lon + (j + 1) * lon_step
-        )
+        BBox(lats[i], lons[j], lats[i + 1], lons[j + 1])
         for i in range(divider)
         for j in range(divider)
     ]
@@ -1,18 +1,61 @@
 import os
 import json
+import hashlib
 import logging
-from collections import defaultdict
-from typing import Dict, Any, List, Tuple
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Set, Tuple
 
 from classification_config import CLASSIFICATION_RULES
+from json_io import load_json, dump_json, encode_json_line, load_json_lines
 from quadtree_builder import Quad, build_quadtree_for_category
 
 # ---------------------------------------------------------------------
 # Constants and Logger
 # ---------------------------------------------------------------------
 UNCLASSIFIED_FILE = "unclassified_pois.json"
+DEBUG_JSON = False  # Pretty-print quadtree files (2-space indent) for manual inspection
 logger = logging.getLogger(__name__)
 
+# ---------------------------------------------------------------------
+# Rule Index (built once at import time)
+#   _EXACT:    (tag_key, tag_value) -> (category, subcategory)
+#   _WILD:     tag_key -> (category, subcategory) for '*' fallbacks
+#   _PRIORITY: tag_key -> position in CLASSIFICATION_RULES (lower wins)
+# ---------------------------------------------------------------------
+_EXACT: Dict[Tuple[str, str], Tuple[str, str]] = {
+    (key, val): cat_sub
+    for key, mapping in CLASSIFICATION_RULES.items()
+    for val, cat_sub in mapping.items()
+    if val != '*'
+}
+_WILD: Dict[str, Tuple[str, str]] = {
+    key: mapping['*']
+    for key, mapping in CLASSIFICATION_RULES.items()
+    if '*' in mapping
+}
+_PRIORITY: Dict[str, int] = {key: i for i, key in enumerate(CLASSIFICATION_RULES)}
+
+# Keys that do not count as meaningful tags
+_SKIP_KEYS = frozenset(("id", "osm_type", "lat", "lon", "created_by"))
+
+# ---------------------------------------------------------------------
+# Name-based fallback rules, checked in order on the lower-cased name.
+#   _NAME_PATTERN: one alternation of all keywords (a single scan per name)
+#   _NAME_RULES:   keyword group -> (category, subcategory)
+# ---------------------------------------------------------------------
+_NAME_RULES: List[Tuple[Tuple[str, ...], Tuple[str, str]]] = [
+    (("hut", "cabin"), ("Accommodation", "Hut")),
+    (("gipfel",), ("Nature", "Peak")),
+    (("waterfall", "falls", "cascad"), ("Nature", "Waterfall")),
+]
+_NAME_PATTERN = re.compile("|".join(
+    f"(?P<r{i}>{'|'.join(map(re.escape, words))})"
+    for i, (words, _) in enumerate(_NAME_RULES)
+))
+
 # ---------------------------------------------------------------------
 # Classification
 # ---------------------------------------------------------------------
@@ -20,40 +63,112 @@ def classify_via_dict(props: Dict[str, Any]) -> Tuple[str, str] | None:
     """
     Classify a POI using CLASSIFICATION_RULES. Returns (category, subcategory) or None if not found.
     Uses '*' as a fallback if a specific value is missing.
+    Looks up each tag of the POI in the prebuilt rule index; if several tags match,
+    the key listed first in CLASSIFICATION_RULES wins.
     """
-    for key, mapping in CLASSIFICATION_RULES.items():
-        if key in props:
-            val = props[key]
-            if val in mapping:
-                return mapping[val]
-            if '*' in mapping:
-                return mapping['*']
-    return None
+    best = None
+    best_rank = len(_PRIORITY)
+    for key, val in props.items():
+        rank = _PRIORITY.get(key)
+        if rank is None or rank >= best_rank:
+            continue
+        cat_sub = _EXACT.get((key, val)) or _WILD.get(key)
+        if cat_sub is not None:
+            best, best_rank = cat_sub, rank
+    return best
 
-def store_unclassified(feature: Dict[str, Any]) -> None:
+def classify_via_name(name: str) -> Tuple[str, str] | None:
     """
-    Append minimal unclassified POI data to UNCLASSIFIED_FILE.
+    Classify a POI by keywords in its name. Returns (category, subcategory) or None.
+    If keywords of several rules occur, the rule listed first in _NAME_RULES wins.
+    """
+    if not name:
+        return None
+    return _classify_name_cached(name)
+
+@lru_cache(maxsize=1 << 16)
+def _classify_name_cached(name: str) -> Tuple[str, str] | None:
+    """
+    Keyword scan behind classify_via_name, memoized per raw name.
+    OSM names repeat a lot (e.g. "Spielplatz", "Bushaltestelle"), so most lookups skip lower() and the scan.
     """
-    record = {
-        "id": feature["properties"].get("id"),
-        "osm_type": feature["properties"].get("osm_type"),
-        "lat": feature["properties"].get("lat"),
-        "lon": feature["properties"].get("lon"),
+    best = None
+    for match in _NAME_PATTERN.finditer(name.lower()):
+        rule = int(match.lastgroup[1:])
+        if best is None or rule < best:
+            best = rule
+            if rule == 0:
+                break
+    return _NAME_RULES[best][1] if best is not None else None
+
+def _unclassified_record(feature: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the minimal record stored for an unclassified POI.
+    """
+    props = feature["properties"]
+    return {
+        "id": props.get("id"),
+        "osm_type": props.get("osm_type"),
+        "lat": props.get("lat"),
+        "lon": props.get("lon"),
         "tags": {
             k: v
-            for k, v in feature["properties"].items()
+            for k, v in props.items()
             if k not in ("id", "osm_type", "lat", "lon")
         },
     }
+
+def store_unclassified(feature: Dict[str, Any]) -> None:
+    """
+    Append minimal unclassified POI data to UNCLASSIFIED_FILE.
+    Opens the file per call; batch callers should use an UnclassifiedSink instead.
+    """
     with open(UNCLASSIFIED_FILE, "a", encoding="utf-8") as file_obj:
-        json.dump(record, file_obj, ensure_ascii=False)
+        json.dump(_unclassified_record(feature), file_obj, ensure_ascii=False)
         file_obj.write("\n")
 
-def classify_poi(feature: Dict[str, Any]) -> Tuple[str, str, str]:
+class UnclassifiedSink:
+    """
+    Context-managed appender for unclassified POIs.
+    Keeps UNCLASSIFIED_FILE open and writes buffered records every 'flush_every' entries.
+    """
+
+    def __init__(self, path: str = UNCLASSIFIED_FILE, flush_every: int = 4096):
+        self.path = path
+        self.flush_every = flush_every
+        self._buffer: List[str] = []
+        self._file = None
+
+    def __enter__(self) -> "UnclassifiedSink":
+        self._file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def write(self, feature: Dict[str, Any]) -> None:
+        """Queue one unclassified feature; flushes once the buffer is full."""
+        self._buffer.append(json.dumps(_unclassified_record(feature), ensure_ascii=False))
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all buffered records as JSON lines."""
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer.clear()
+
+def classify_poi(
+    feature: Dict[str, Any],
+    sink: UnclassifiedSink | None = None
+) -> Tuple[str, str, str]:
     """
     Classify a feature into (category, subcategory, reason).
       - Return ("Discard", "Discard", <reason>) if missing geometry, tags, or unclassifiable.
       - Otherwise return (category, subcategory, "ok").
+    Unclassified features go to 'sink' if given, else are appended via store_unclassified.
     """
     props = feature.get("properties", {})
 
@@ -61,31 +176,250 @@ def classify_poi(feature: Dict[str, Any]) -> Tuple[str, str, str]:
     if props.get("lat") is None or props.get("lon") is None:
         return ("Discard", "Discard", "missing_geometry")
 
-    # 2) Check tags
-    skip_keys = ("id", "osm_type", "lat", "lon", "created_by")
-    tag_keys = [k for k in props if k not in skip_keys]
-    if not tag_keys:
+    # 2) + 3) Tag checks and dict-based classification
+    tag_cls = _classify_by_tags(props)
+    if tag_cls is not None:
+        return tag_cls
+
+    # 4) + 5) Name-based fallback, else unclassified
+    return _classify_by_name(feature, props, sink)
+
+
+def _classify_by_tags(props: Dict[str, Any]) -> Tuple[str, str, str] | None:
+    """
+    The part of classify_poi decided by the tags alone (feature must have geometry):
+    a "no_tags" discard or a dict-based match. Returns None if the name fallback has to decide.
+    """
+    # Check tags (C-level set check; no per-feature list)
+    if props.keys() <= _SKIP_KEYS:
         return ("Discard", "Discard", "no_tags")
 
-    # 3) Dict-based classification
+    # Dict-based classification
     dict_cls = classify_via_dict(props)
     if dict_cls:
         return (*dict_cls, "ok")
+    return None
+
+
+def _classify_by_name(
+    feature: Dict[str, Any],
+    props: Dict[str, Any],
+    sink: UnclassifiedSink | None
+) -> Tuple[str, str, str]:
+    """
+    The name-based fallback of classify_poi; records the feature as unclassified if the name doesn't match either.
+    """
+    name_cls = classify_via_name(props.get("name", ""))
+    if name_cls:
+        return (*name_cls, "ok")
 
-    # 4) Name-based fallback
-    name = props.get("name", "").lower()
-    if "hut" in name or "cabin" in name:
-        return ("Accommodation", "Hut", "ok")
-    if "gipfel" in name:
-        return ("Nature", "Peak", "ok")
-    if any(w in name for w in ("waterfall", "falls", "cascad")):
-        return ("Nature", "Waterfall", "ok")
-
-    # 5) Unclassified fallback
-    store_unclassified(feature)
+    _record_unclassified(feature, sink)
     return ("Discard", "Discard", "unclassified")
 
 
+def _record_unclassified(feature: Dict[str, Any], sink: UnclassifiedSink | None) -> None:
+    """
+    Write an unclassified feature to 'sink', or append it directly if there is none.
+    """
+    if sink is not None:
+        sink.write(feature)
+    else:
+        store_unclassified(feature)
+
+
+def _classification_signature(props: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    Hashable summary of everything _classify_by_tags looks at for a feature with geometry:
+    whether it has meaningful tags and its CLASSIFICATION_RULES tags. The name is deliberately left out,
+    so the number of distinct signatures stays bounded by the rule-tag combinations.
+    """
+    rule_tags = tuple(sorted((k, v) for k, v in props.items() if k in _PRIORITY))
+    has_tags = bool(rule_tags) or not props.keys() <= _SKIP_KEYS
+    return (has_tags, rule_tags)
+
+
+_NOT_CACHED = object()
+
+
+def classify_batch(
+    features: List[Dict[str, Any]],
+    cat_map: Dict[Tuple[str, str], List[Dict[str, Any]]],
+    discard_stats: Dict[str, int],
+    keep_subcats: Set[str] | None = None,
+    sink: UnclassifiedSink | None = None,
+    cache: Dict[Tuple[Any, ...], Tuple[str, str, str] | None] | None = None
+) -> None:
+    """
+    Classify a whole batch of features (e.g. one preprocessed tile) in a single tight loop.
+      - Classified features are appended to cat_map[(category, subcategory)].
+      - Discards are counted in discard_stats by reason.
+      - If 'keep_subcats' is given, features of other subcategories are dropped.
+      - Unclassified features are written to 'sink' (see classify_poi).
+      - Tag-based results are memoized in 'cache' by rule-tag signature (the name fallback runs per feature);
+        pass the same dict to reuse it across batches.
+    """
+    classify = classify_poi
+    signature = _classification_signature
+    if cache is None:
+        cache = {}
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for feat in features:
+        props = feat.get("properties", {})
+        if props.get("lat") is None or props.get("lon") is None:
+            # Cheap discard; not worth a cache entry
+            cat, sub, reason = classify(feat, sink)
+        else:
+            sig = signature(props)
+            tag_cls = cache.get(sig, _NOT_CACHED)
+            if tag_cls is _NOT_CACHED:
+                tag_cls = cache[sig] = _classify_by_tags(props)
+            if tag_cls is None:
+                # Tags alone don't decide; the (memoized) name fallback does, per feature
+                cat, sub, reason = _classify_by_name(feat, props, sink)
+            else:
+                cat, sub, reason = tag_cls
+        if cat == "Discard":
+            if reason in discard_stats:
+                discard_stats[reason] += 1
+            else:
+                discard_stats["unclassified"] += 1
+            continue
+        group = groups.get((cat, sub))
+        if group is None:
+            group = groups[(cat, sub)] = []
+        group.append(feat)
+
+    # Merge per-(cat, sub) groups once instead of per feature
+    for cat_sub, feats in groups.items():
+        if keep_subcats is not None and cat_sub[1] not in keep_subcats:
+            continue
+        cat_map.setdefault(cat_sub, []).extend(feats)
+
+
+# ---------------------------------------------------------------------
+# Classified Feature Spill / Cache
+#   Classified features are streamed to one JSON-lines file per (category, subcategory)
+#   instead of being held in memory for the whole country. The spill directory doubles
+#   as the classification cache:
+#     <dir>/<Category>_<Subcategory>.jsonl: one feature per line
+#     <dir>/index.json: {"total": int, "discard_stats": {...}, "groups": [[cat, sub, file, count], ...]}
+#     <dir>/meta.json:  fingerprint of the inputs + rules the spill was built from
+# ---------------------------------------------------------------------
+SPILL_INDEX = "index.json"
+SPILL_META = "meta.json"
+
+def _subcat_folder_name(category: str, subcat: str) -> str:
+    """Folder/file stem for a (category, subcategory), e.g. 'Food_&_Drink_Café'."""
+    return f"{category.replace(' ', '_')}_{subcat.replace(' ', '_')}"
+
+class SubcatSpill:
+    """
+    Context-managed writer that appends classified features to per-subcat JSON-lines files in 'spill_dir'.
+    Any previous spill (and its fingerprint) in 'spill_dir' is discarded on enter.
+    """
+
+    def __init__(self, spill_dir: str):
+        self.spill_dir = spill_dir
+        self.groups: Dict[Tuple[str, str], Tuple[str, int]] = {}
+        self._files: Dict[Tuple[str, str], Any] = {}
+
+    def __enter__(self) -> "SubcatSpill":
+        os.makedirs(self.spill_dir, exist_ok=True)
+        # Drop the fingerprint first so a half-rewritten spill is never trusted
+        for name in [SPILL_META, SPILL_INDEX] + sorted(os.listdir(self.spill_dir)):
+            path = os.path.join(self.spill_dir, name)
+            if (name in (SPILL_META, SPILL_INDEX) or name.endswith(".jsonl")) and os.path.exists(path):
+                os.remove(path)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        for file_obj in self._files.values():
+            file_obj.close()
+        self._files.clear()
+
+    def write_groups(self, cat_map: Dict[Tuple[str, str], List[Dict[str, Any]]]) -> None:
+        """Append each group's features to its subcat file."""
+        for cat_sub, feats in cat_map.items():
+            file_obj = self._files.get(cat_sub)
+            if file_obj is None:
+                path = os.path.join(self.spill_dir, _subcat_folder_name(*cat_sub) + ".jsonl")
+                file_obj = self._files[cat_sub] = open(path, "wb")
+                self.groups[cat_sub] = (path, 0)
+            file_obj.write(b"".join(encode_json_line(f) for f in feats))
+            path, count = self.groups[cat_sub]
+            self.groups[cat_sub] = (path, count + len(feats))
+
+def classification_fingerprint(
+    input_json_paths: List[str],
+    keep_subcats: Set[str] | None
+) -> Dict[str, Any]:
+    """
+    Describe everything the classification result depends on: input files (path, mtime, size),
+    the classification rules, and the subcategory filter.
+    """
+    rules = json.dumps([CLASSIFICATION_RULES, _NAME_RULES], sort_keys=True)
+    inputs = []
+    for path in sorted(input_json_paths):
+        st = os.stat(path)
+        inputs.append([os.path.abspath(path), st.st_mtime_ns, st.st_size])
+    return {
+        "inputs": inputs,
+        "rules_hash": hashlib.blake2b(rules.encode("utf-8"), digest_size=16).hexdigest(),
+        "keep_subcats": sorted(keep_subcats) if keep_subcats is not None else None,
+    }
+
+def load_classified(
+    cache_dir: str,
+    fingerprint: Dict[str, Any]
+) -> Tuple[Dict[Tuple[str, str], Tuple[str, int]], Dict[str, int], int] | None:
+    """
+    Load (groups, discard_stats, total_feats) from the spill in 'cache_dir' if it was built from 'fingerprint'.
+    'groups' maps (category, subcategory) -> (jsonl_path, feature_count).
+    Returns None if there is no cache or it is stale/unreadable, or if any of its spill files is missing.
+    """
+    meta_path = os.path.join(cache_dir, SPILL_META)
+    index_path = os.path.join(cache_dir, SPILL_INDEX)
+    if not (os.path.exists(meta_path) and os.path.exists(index_path)):
+        return None
+    try:
+        if load_json(meta_path) != fingerprint:
+            return None
+        index = load_json(index_path)
+        groups = {
+            (cat, sub): (os.path.join(cache_dir, file_name), count)
+            for cat, sub, file_name, count in index["groups"]
+        }
+        # A spill file deleted by hand would otherwise only fail later inside a build worker
+        missing = [path for path, _ in groups.values() if not os.path.exists(path)]
+        if missing:
+            logger.warning("Ignoring incomplete classification cache '%s': %d spill file(s) missing", cache_dir, len(missing))
+            return None
+        return groups, index["discard_stats"], index["total"]
+    except (ValueError, KeyError) as e:
+        logger.warning("Ignoring unreadable classification cache '%s': %s", cache_dir, e)
+        return None
+
+def save_classified(
+    cache_dir: str,
+    fingerprint: Dict[str, Any],
+    groups: Dict[Tuple[str, str], Tuple[str, int]],
+    discard_stats: Dict[str, int],
+    total_feats: int
+) -> None:
+    """
+    Write the index for a finished spill plus its fingerprint (written last, so a partial write is never trusted).
+    """
+    dump_json({
+        "total": total_feats,
+        "discard_stats": discard_stats,
+        "groups": [
+            [cat, sub, os.path.basename(path), count]
+            for (cat, sub), (path, count) in groups.items()
+        ],
+    }, os.path.join(cache_dir, SPILL_INDEX))
+    dump_json(fingerprint, os.path.join(cache_dir, SPILL_META))
+
+
 # ---------------------------------------------------------------------
 # Helper: subdivide a bounding box into 16 smaller sub‐bboxes
 #         by subdividing twice.
@@ -104,21 +438,114 @@ def subdivide_into_16(big_bbox: Quad) -> List[Quad]:
     return sub16
 
 
+# Position of grid cell (row, col) — row 0 = south, col 0 = west — in the
+# order produced by subdivide_into_16 (quadrant-major, SW/SE/NW/NE each level).
+# Flattened row-major: _GRID_TO_CHUNK[row * 4 + col].
+_GRID_TO_CHUNK: Tuple[int, ...] = tuple(
+    (row // 2 * 2 + col // 2) * 4 + (row % 2) * 2 + col % 2
+    for row in range(4)
+    for col in range(4)
+)
+
+def bucket_into_16(features: List[Dict[str, Any]], big_bbox: Quad) -> List[List[Dict[str, Any]]]:
+    """
+    Assign each feature to one of the 16 chunks of subdivide_into_16(big_bbox) in a single pass.
+    The chunk index is computed arithmetically from the feature's coordinates; features outside 'big_bbox' are dropped.
+    Features on a shared chunk edge go to the northern/eastern chunk.
+    """
+    south, west, north, east = big_bbox.to_tuple()
+    lat_scale = 4.0 / (north - south)
+    lon_scale = 4.0 / (east - west)
+
+    buckets: List[List[Dict[str, Any]]] = [[] for _ in range(16)]
+    # One bound append per grid cell, so the loop body is a single indexed call
+    appenders = [buckets[chunk].append for chunk in _GRID_TO_CHUNK]
+    for feat in features:
+        lon, lat = feat["geometry"]["coordinates"]
+        if not (south <= lat <= north and west <= lon <= east):
+            continue
+        row = int((lat - south) * lat_scale)
+        col = int((lon - west) * lon_scale)
+        # Only points on the north/east border reach index 4
+        appenders[(row if row < 4 else 3) * 4 + (col if col < 4 else 3)](feat)
+    return buckets
+
+
 # ---------------------------------------------------------------------
 # Quadtree Building
 # ---------------------------------------------------------------------
+def _build_one_subcat(
+    category: str,
+    subcat: str,
+    spill_path: str,
+    bbox_corners: Tuple[float, float, float, float],
+    output_folder: str
+) -> int:
+    """
+    Build and save the 16 chunked quadtrees of one (category, subcategory).
+    Top-level (picklable) so it can run in a worker process; 'bbox_corners' is (south, west, north, east).
+    Features are read from the subcat's spill file, so only this subcat is held in the worker's memory.
+    Returns the number of non-empty chunks written.
+    """
+    feats = load_json_lines(spill_path)
+    logger.info("   → Building 16 sub‐quadtrees for %s/%s with %d features",
+                category, subcat, len(feats))
+
+    # Create a dedicated folder for this subcat
+    subcat_folder_path = os.path.join(output_folder, _subcat_folder_name(category, subcat))
+    os.makedirs(subcat_folder_path, exist_ok=True)
+
+    # Subdivide into 16 bounding boxes and bucket features in one pass
+    master_bbox = Quad.from_tuple(bbox_corners)
+    chunk_bboxes = subdivide_into_16(master_bbox)
+    chunk_buckets = bucket_into_16(feats, master_bbox)
+
+    n_written = 0
+    for i, (cbox, chunk_feats) in enumerate(zip(chunk_bboxes, chunk_buckets)):
+        if not chunk_feats:
+            # If no features in this chunk, we can skip building an empty quadtree
+            continue
+
+        # Build quadtree with max_depth=6
+        qt = build_quadtree_for_category(
+            features=chunk_feats,
+            bbox=cbox,
+            max_per_node=50  # leave as is
+        )
+
+        # Save to file: "quadtree_0.json", "quadtree_1.json", ...
+        out_name = f"quadtree_{i}.json"
+        out_path = os.path.join(subcat_folder_path, out_name)
+        if DEBUG_JSON:
+            dump_json(qt.to_dict(), out_path)
+        else:
+            with open(out_path, "wb") as f:
+                qt.dump_json(f)
+        n_written += 1
+
+        logger.info("     → Saved %s with %d features", out_name, len(chunk_feats))
+
+    return n_written
+
+
 def build_subcat_quadtrees(
     input_json_paths: List[str],
     master_bbox: Quad,
     output_folder: str,
     only_subcats: bool = False,
-    test_subcats: List[str] = None
+    test_subcats: List[str] = None,
+    max_workers: int | None = None,
+    cache_dir: str | None = None
 ) -> None:
     """
     Classify, group, and build chunked quadtrees for each (category, subcategory).
       - Subdivide 'master_bbox' into 16 smaller bounding boxes
       - For each sub-bbox, build a separate quadtree (max_depth=6)
       - Write each of the 16 quadtrees to its own file, in a subfolder.
+    Subcategories are built in parallel on up to 'max_workers' processes (default: all cores).
+    Classified features are spilled to per-subcat files (see SubcatSpill) rather than kept in memory.
+    If 'cache_dir' is given, the spill is kept there and reused on later runs while the inputs,
+    rules and subcategory filter are unchanged; otherwise a temporary directory is used.
     """
     if test_subcats is None:
         test_subcats = ["Peak"]
@@ -130,76 +557,60 @@ def build_subcat_quadtrees(
         "unclassified": 0
     }
 
-    cat_map = defaultdict(list)
-
-    # 1) Read + classify features
-    for path in input_json_paths:
-        logger.info("Reading preprocessed file: %s", path)
-        with open(path, "r", encoding="utf-8") as file_obj:
-            feats_in_file = json.load(file_obj)
-
-        for feat in feats_in_file:
-            total_feats += 1
-            cat, sub, reason = classify_poi(feat)
-
-            if cat == "Discard":
-                if reason in discard_stats:
-                    discard_stats[reason] += 1
-                else:
-                    discard_stats["unclassified"] += 1
-                continue
-
-            if only_subcats and sub not in test_subcats:
-                continue
-
-            cat_map[(cat, sub)].append(feat)
-
-    # Summaries
-    total_discarded = sum(discard_stats.values())
-    logger.info(
-        "After classification: total=%d, #subcats=%d, discards=%d",
-        total_feats, len(cat_map), total_discarded
-    )
-
-    os.makedirs(output_folder, exist_ok=True)
-    logger.info("Outputting quadtrees to directory: %s", output_folder)
-
-    # 2) Build and save chunked quadtrees
-    for (category, subcat), feats in cat_map.items():
-        logger.info("   → Building 16 sub‐quadtrees for %s/%s with %d features",
-                    category, subcat, len(feats))
-        
-        # Create a dedicated folder for this subcat
-        subcat_folder_name = f"{category.replace(' ', '_')}_{subcat.replace(' ', '_')}"
-        subcat_folder_path = os.path.join(output_folder, subcat_folder_name)
-        os.makedirs(subcat_folder_path, exist_ok=True)
-
-        # Subdivide into 16 bounding boxes
-        chunk_bboxes = subdivide_into_16(master_bbox)
-
-        for i, cbox in enumerate(chunk_bboxes):
-            # Filter features that lie in cbox
-            chunk_feats = [f for f in feats if cbox.contains_feature(f)]
-            if not chunk_feats:
-                # If no features in this chunk, we can skip building an empty quadtree
-                continue
-
-            # Build quadtree with max_depth=6
-            qt = build_quadtree_for_category(
-                features=chunk_feats,
-                bbox=cbox,
-                max_per_node=50  # leave as is
-            )
+    keep_subcats = set(test_subcats) if only_subcats else None
 
-            # Save to file: "quadtree_0.json", "quadtree_1.json", ...
-            out_name = f"quadtree_{i}.json"
-            out_path = os.path.join(subcat_folder_path, out_name)
-            with open(out_path, "w", encoding="utf-8") as file_obj:
-                json.dump(qt.to_dict(), file_obj, indent=2, ensure_ascii=False)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        spill_dir = cache_dir or tmp_dir
 
-            logger.info("     → Saved %s with %d features", out_name, len(chunk_feats))
-        
-        logger.info("   → Subcat '%s/%s': wrote %d non-empty chunks", category, subcat, i + 1)
+        # 1) Read + classify features (or reuse a still-valid classification cache)
+        fingerprint = classification_fingerprint(input_json_paths, keep_subcats)
+        cached = load_classified(cache_dir, fingerprint) if cache_dir else None
+        if cached is not None:
+            logger.info("Using cached classification: %s", cache_dir)
+            groups, discard_stats, total_feats = cached
+        else:
+            # Shared across tiles: keyed on rule tags only, so it stays bounded by the distinct
+            # rule-tag combinations and parent memory stays at roughly one tile plus the spill buffers
+            classify_cache: Dict[Tuple[Any, ...], Tuple[str, str, str] | None] = {}
+            with UnclassifiedSink() as sink, SubcatSpill(spill_dir) as spill:
+                for path in input_json_paths:
+                    logger.info("Reading preprocessed file: %s", path)
+                    feats_in_file = load_json(path)
+
+                    total_feats += len(feats_in_file)
+                    tile_map: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+                    classify_batch(feats_in_file, tile_map, discard_stats, keep_subcats, sink, classify_cache)
+                    spill.write_groups(tile_map)
+            groups = spill.groups
+
+            if cache_dir:
+                save_classified(cache_dir, fingerprint, groups, discard_stats, total_feats)
+
+        # Summaries
+        total_discarded = sum(discard_stats.values())
+        logger.info(
+            "After classification: total=%d, #subcats=%d, discards=%d",
+            total_feats, len(groups), total_discarded
+        )
+
+        os.makedirs(output_folder, exist_ok=True)
+        logger.info("Outputting quadtrees to directory: %s", output_folder)
+
+        # 2) Build and save chunked quadtrees, one subcat per worker process
+        bbox_corners = master_bbox.to_tuple()
+        subcat_keys = list(groups)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            written = executor.map(
+                _build_one_subcat,
+                [cat for cat, _ in subcat_keys],
+                [sub for _, sub in subcat_keys],
+                [groups[key][0] for key in subcat_keys],
+                [bbox_corners] * len(subcat_keys),
+                [output_folder] * len(subcat_keys),
+                chunksize=1,
+            )
+            for (category, subcat), n_chunks in zip(subcat_keys, written):
+                logger.info("   → Subcat '%s/%s': wrote %d non-empty chunks", category, subcat, n_chunks)
 
     # Final classification summary
     logger.info("Classification Summary:")
@@ -1,11 +1,51 @@
+import hashlib
 import logging
 import os
+import threading
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from typing import List, Tuple
 from bbox_handler import BBox, get_austria_bbox
 
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+# Query for all nodes in a bbox: {0}=min_lat, {1}=min_lon, {2}=max_lat, {3}=max_lon
+OVERPASS_QUERY_TEMPLATE = "[out:json][timeout:900];(node({0},{1},{2},{3}););out center;"
+MAX_WORKERS = 2            # Overpass allows 2 parallel slots per client
+MIN_REQUEST_INTERVAL = 1.0  # Seconds between request starts (shared by all workers)
+
+# Shared session: keeps HTTP connections alive across tile requests
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+SESSION.headers["Accept-Encoding"] = "gzip"  # requests decompresses transparently
+
+# -----------------------------------------------------------------------------
+# Rate Limiting
+# -----------------------------------------------------------------------------
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces request starts at least 'interval' seconds apart.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self) -> None:
+        """Block until the caller may start its next request."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+_rate_limiter = RateLimiter(MIN_REQUEST_INTERVAL)
 
 # -----------------------------------------------------------------------------
 # Helper Functions
@@ -16,20 +56,33 @@ def build_overpass_query(bbox: BBox) -> str:
     Build an Overpass query to retrieve all nodes within 'bbox'.
     Returns a string that can be sent to Overpass via GET or POST.
     """
-    query = f"""
-    [out:xml][timeout:900];
-    (
-      node({bbox.min_lat},{bbox.min_lon},{bbox.max_lat},{bbox.max_lon});
-    );
-    out center;
+    return OVERPASS_QUERY_TEMPLATE.format(bbox.min_lat, bbox.min_lon, bbox.max_lat, bbox.max_lon)
+
+
+def tile_cache_key(bbox: BBox) -> str:
+    """
+    Return a stable cache key for 'bbox': a hash of the exact Overpass query sent for it.
+    Changing the tile steps or the query template yields new keys instead of reusing stale tiles.
     """
-    return query.strip()
+    return hashlib.blake2b(build_overpass_query(bbox).encode("utf-8"), digest_size=16).hexdigest()
 
 
-def fetch_osm_data(bbox: BBox) -> str:
+def _retry_after_seconds(response: requests.Response, default: float) -> float:
+    """
+    Return the delay requested by a 'Retry-After' header (in seconds), or 'default' if absent/unparseable.
+    """
+    header = response.headers.get("Retry-After")
+    try:
+        return max(float(header), 0.0) if header is not None else default
+    except ValueError:
+        return default
+
+
+def fetch_osm_data(bbox: BBox, dest_path: str) -> None:
     """
     Attempt to fetch OpenStreetMap data from Overpass for 'bbox'.
-    Returns the Overpass XML response as a string if successful.
+    The query is sent as a POST body, and the (decompressed) JSON response is streamed to 'dest_path'.
+    The file is written under a temporary name and only moved into place once complete.
     """
     query = build_overpass_query(bbox)
     max_attempts = 3
@@ -37,19 +90,26 @@ def fetch_osm_data(bbox: BBox) -> str:
     for attempt in range(max_attempts):
         try:
             logging.info(f"[Attempt {attempt+1}/{max_attempts}] Overpass query for: {bbox}")
-            response = requests.get(OVERPASS_URL, params={"data": query}, timeout=600)
+            _rate_limiter.wait()
+            response = SESSION.post(OVERPASS_URL, data={"data": query}, timeout=600, stream=True)
             
-            # Check for rate-limiting
+            # Check for rate-limiting; prefer the server's Retry-After hint
             if response.status_code == 429:
                 logging.warning(f"Received 429 Too Many Requests from Overpass on attempt {attempt+1}.")
-                backoff_seconds = 5 * (attempt + 1)
+                backoff_seconds = _retry_after_seconds(response, default=5 * (attempt + 1))
                 logging.info(f"Sleeping {backoff_seconds}s before retry...")
+                response.close()
                 time.sleep(backoff_seconds)
                 continue  # retry
 
-            response.raise_for_status()  # raises HTTPError if status not 200
-            time.sleep(1.0)
-            return response.text
+            with response:
+                response.raise_for_status()  # raises HTTPError if status not 200
+                part_path = dest_path + ".part"
+                with open(part_path, 'wb') as f:
+                    for block in response.iter_content(chunk_size=1 << 20):
+                        f.write(block)
+            os.replace(part_path, dest_path)
+            return
         
         except requests.exceptions.RequestException as e:
             logging.warning(f"Request error on attempt {attempt+1}/{max_attempts}: {e}")
@@ -116,13 +176,14 @@ def fetch_or_load_tile(
     """
     For a given 'bbox' tile, returns a tuple (is_fresh, tile_path):
       - If 'skip_fetch' is True and the tile file exists, does not refetch. is_fresh=False.
-      - Otherwise fetch from Overpass, save to tile_{tile_id}.xml, is_fresh=True.
-
+      - Otherwise fetch from Overpass, save to tile_<key>.json, is_fresh=True.
+    The file name uses tile_cache_key(bbox), so cached tiles are found by bbox + query, not by position;
+    'tile_id' is only used for logging.
     """
     if not os.path.exists(cache_dir):
         os.makedirs(cache_dir, exist_ok=True)
 
-    tile_path = os.path.join(cache_dir, f"tile_{tile_id}.xml")
+    tile_path = os.path.join(cache_dir, f"tile_{tile_cache_key(bbox)}.json")
 
     # If skip_fetch is set and file exists, no fetch
     if skip_fetch and os.path.exists(tile_path):
@@ -131,9 +192,7 @@ def fetch_or_load_tile(
 
     # Otherwise, fetch fresh
     logging.info(f"[Tile {tile_id}] Fetching Overpass data...")
-    xml_data = fetch_osm_data(bbox)
-    with open(tile_path, 'w', encoding='utf-8') as f:
-        f.write(xml_data)
+    fetch_osm_data(bbox, tile_path)
     logging.info(f"[Tile {tile_id}] Saved Overpass data to {tile_path}")
 
     return True, tile_path
@@ -144,26 +203,42 @@ def fetch_tiles_in_steps(
     lat_step: float = 0.5,
     lon_step: float = 0.5,
     cache_dir: str = "data/overpass_cache",
-    skip_fetch: bool = False
+    skip_fetch: bool = False,
+    max_workers: int = MAX_WORKERS
 ) -> List[str]:
     """
-    Split 'bbox' by lat/lon steps, then for each sub-tile either load a cached Overpass XML (if 'skip_fetch' and file exists) or fetch new data from Overpass. 
-    Returns a list of file paths to the .xml tiles.
+    Split 'bbox' by lat/lon steps, then for each sub-tile either load a cached Overpass tile (if 'skip_fetch' and file exists) or fetch new data from Overpass. 
+    Tiles are fetched concurrently by up to 'max_workers' threads; the returned order still matches the tile order.
+    If a tile fails, tiles not yet started are cancelled and its exception is re-raised.
+    Returns a list of file paths to the cached tiles.
     """
     sub_bboxes = generate_tile_bboxes(bbox, lat_step, lon_step)
-    xml_file_paths = []
+    tile_file_paths: List[str] = [""] * len(sub_bboxes)
 
-    for idx, subbox in enumerate(sub_bboxes):
-        logging.info(f"[Tile {idx}] BBox={subbox}")
-        is_fresh, tile_path = fetch_or_load_tile(subbox, idx, cache_dir, skip_fetch)
-        xml_file_paths.append(tile_path)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for idx, subbox in enumerate(sub_bboxes):
+            logging.info(f"[Tile {idx}] BBox={subbox}")
+            future = executor.submit(fetch_or_load_tile, subbox, idx, cache_dir, skip_fetch)
+            futures[future] = idx
 
-        if is_fresh:
-            logging.info(f"[Tile {idx}] Downloaded new data from Overpass.")
-        else:
-            logging.info(f"[Tile {idx}] Using cached data; no fetch needed.")
-
-    return xml_file_paths
+        try:
+            for future in as_completed(futures):
+                idx = futures[future]
+                is_fresh, tile_path = future.result()
+                tile_file_paths[idx] = tile_path
+
+                if is_fresh:
+                    logging.info(f"[Tile {idx}] Downloaded new data from Overpass.")
+                else:
+                    logging.info(f"[Tile {idx}] Using cached data; no fetch needed.")
+        except BaseException:
+            # Stop on the first failed tile: drop queued tiles instead of letting the
+            # executor's exit fetch all of them first (only in-flight requests finish)
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    return tile_file_paths
 
 def fetch_tiles_for_bbox(
     bbox: BBox,
@@ -174,7 +249,7 @@ def fetch_tiles_for_bbox(
 ) -> List[str]:
     """
     Splits 'bbox' into tile bboxes (via lat/lon steps), then either fetches from Overpass or uses existing cache depending on 'skip_fetch'.
-    Returns a list of .xml file paths for all tiles.
+    Returns a list of .json tile file paths.
     """
     return fetch_tiles_in_steps(
         bbox=bbox,
@@ -211,12 +286,12 @@ if __name__ == "__main__":
         "--cache_dir", 
         type=str, 
         default="data/overpass_cache",
-        help="Local folder to store the downloaded/cached .xml tiles."
+        help="Local folder to store the downloaded/cached .json tiles."
     )
     parser.add_argument(
         "--skip_fetch",
         action="store_true",
-        help="If set, do not re-fetch if tile XML files already exist."
+        help="If set, do not re-fetch if tile files already exist."
     )
     args = parser.parse_args()
 
@@ -1,8 +1,9 @@
-import json
 import logging
 import os
+from collections import defaultdict
 from typing import Dict, Set
 from classification_config import CLASSIFICATION_RULES
+from json_io import dump_json
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -20,19 +21,16 @@ def export_subcat_definitions(output_path: str) -> None:
     """
     logger.info("Exporting subcat definitions to '%s'", output_path)
 
-    category_map: Dict[str, Set[str]] = {}
-    for tag_key, value_map in CLASSIFICATION_RULES.items():
-        for osm_value, (cat_name, subcat_name) in value_map.items():
-            if cat_name not in category_map:
-                category_map[cat_name] = set()
+    category_map: Dict[str, Set[str]] = defaultdict(set)
+    for value_map in CLASSIFICATION_RULES.values():
+        for cat_name, subcat_name in value_map.values():
             category_map[cat_name].add(subcat_name)
 
     category_json = {cat: sorted(subcats) for cat, subcats in category_map.items()}
 
     try:
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(category_json, f, indent=2, ensure_ascii=False)
+        dump_json(category_json, output_path)
         logger.info("Subcat definitions successfully written to '%s'", output_path)
     except Exception as e:
         logger.error("Failed to write subcat definitions to '%s': %s", output_path, e)
@@ -0,0 +1,63 @@
+import json
+from typing import Any, List
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder/decoder
+    orjson = None
+
+# -----------------------------------------------------------------------------
+# JSON Read / Write Helpers
+# -----------------------------------------------------------------------------
+
+def load_json(path: str) -> Any:
+    """
+    Read and decode the JSON document at 'path'. Uses orjson's C decoder when available.
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def dump_json(obj: Any, path: str, indent: bool = True) -> None:
+    """
+    Encode 'obj' as UTF-8 JSON and write it to 'path' (2-space indent if 'indent' is set, else compact).
+    The document is encoded in memory and written with a single call.
+    """
+    if orjson is not None:
+        # OPT_NON_STR_KEYS: stringify int keys like the stdlib encoder does
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        data = orjson.dumps(obj, option=option)
+    elif indent:
+        data = json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    else:
+        data = json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def encode_json(obj: Any) -> bytes:
+    """
+    Encode 'obj' as compact UTF-8 JSON bytes (no trailing newline).
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def encode_json_line(obj: Any) -> bytes:
+    """
+    Encode 'obj' as one compact UTF-8 JSON line (newline-terminated).
+    """
+    return encode_json(obj) + b"\n"
+
+
+def load_json_lines(path: str) -> List[Any]:
+    """
+    Read a JSON-lines file written with encode_json_line and decode every line.
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    with open(path, "rb") as f:
+        return [loads(line) for line in f if line.strip()]
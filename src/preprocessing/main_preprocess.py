@@ -1,10 +1,9 @@
 import os
 import sys
-import glob
 import logging
 
 from fetch_overpass import fetch_tiles_for_bbox
-from preprocess_tiles import preprocess_all_tiles
+from preprocess_tiles import preprocess_all_tiles, split_legacy_tiles
 from classification_pipeline import build_subcat_quadtrees
 from quadtree_builder import Quad
 from bbox_handler import get_austria_bbox
@@ -28,6 +27,7 @@ def main(skip_preprocessing: bool, skip_fetch: bool, only_subcats_flag: bool) ->
     cache_dir = os.path.join(project_root, "data", "overpass_cache")
     preproc_dir = os.path.join(project_root, "data", "preprocessed_tiles")
     output_dir = os.path.join(project_root, "public", "data", "quadtrees")
+    classified_cache = os.path.join(project_root, "data", "classified_features")
 
     logger.info("Cache Dir:      %s", cache_dir)
     logger.info("Preproc Dir:    %s", preproc_dir)
@@ -44,22 +44,34 @@ def main(skip_preprocessing: bool, skip_fetch: bool, only_subcats_flag: bool) ->
         cache_dir=cache_dir,
         skip_fetch=skip_fetch
     )
-    logger.info(" → %d XML tiles ready.", len(tile_files))
+    logger.info(" → %d Overpass tiles ready.", len(tile_files))
 
-    # 2) Possibly preprocess
+    # 2) Possibly preprocess (only the tiles of this run's bbox/steps)
+    json_paths = None
     if not skip_preprocessing:
-        logger.info("Step 2: Preprocessing XML → JSON in %s", preproc_dir)
+        logger.info("Step 2: Preprocessing Overpass tiles → features in %s", preproc_dir)
         os.makedirs(preproc_dir, exist_ok=True)
-        preprocess_all_tiles(input_folder=cache_dir, output_folder=preproc_dir)
+        json_paths = preprocess_all_tiles(
+            input_folder=cache_dir,
+            output_folder=preproc_dir,
+            tile_paths=tile_files
+        )
     else:
         logger.info("Skipping preprocessing step; using existing JSON in %s", preproc_dir)
 
-    # 3) Gather all JSON from preproc_dir
+    # 3) Otherwise gather all JSON from preproc_dir
     if not os.path.isdir(preproc_dir):
         logger.error("Directory '%s' does not exist! Exiting.", preproc_dir)
         sys.exit(1)
 
-    json_paths = glob.glob(os.path.join(preproc_dir, "*.json"))
+    if json_paths is None:
+        with os.scandir(preproc_dir) as entries:
+            json_paths = [e.path for e in entries if e.name.endswith(".json") and e.is_file()]
+        # Outputs of legacy position-named tiles would duplicate every POI of the hash-named ones
+        json_paths, legacy_paths = split_legacy_tiles(json_paths)
+        if legacy_paths:
+            logger.warning("Ignoring %d legacy tile_<n>.json files in %s (superseded by hash-named tiles).",
+                           len(legacy_paths), preproc_dir)
     if not json_paths:
         logger.error("No preprocessed JSON found in '%s'! Exiting.", preproc_dir)
         sys.exit(1)
@@ -73,7 +85,8 @@ def main(skip_preprocessing: bool, skip_fetch: bool, only_subcats_flag: bool) ->
         master_bbox=quad_bbox,
         output_folder=output_dir,
         only_subcats=only_subcats_flag,
-        test_subcats=["Peak"]
+        test_subcats=["Peak"],
+        cache_dir=classified_cache
     )
 
     logger.info("=== Done main_preprocess ===")
@@ -1,23 +1,27 @@
 import os
-import glob
-import json
-import xml.etree.ElementTree as ET
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from typing import List, Dict, Any, Tuple
 
+from json_io import load_json, dump_json
+
+try:
+    from lxml import etree as ET  # C-backed parser; same iterparse/Element API
+except ImportError:
+    import xml.etree.ElementTree as ET
+
 # -----------------------------------------------------------------------------
 # Filter / Cleaning Logic
 # -----------------------------------------------------------------------------
 
-def remove_empty_nodes(xml_root: ET.Element) -> List[ET.Element]:
-    """
-    Returns only the <node> elements that contain at least one <tag> child.
-    """
-    valid_nodes = []
-    for node in xml_root.findall('node'):
-        tags = node.findall('tag')
-        if tags:
-            valid_nodes.append(node)
-    return valid_nodes
+# Tag keys ("name", "amenity", ...) repeat across nearly every feature; interning makes all
+# properties dicts share one string object per key instead of one copy per feature.
+_intern = sys.intern
+
+# Properties that don't count as meaningful tags when filtering
+_SKIP_KEYS = frozenset(("id", "osm_type", "lat", "lon", "created_by"))
 
 
 def node_to_feature(node: ET.Element) -> Dict[str, Any]:
@@ -40,26 +44,28 @@ def node_to_feature(node: ET.Element) -> Dict[str, Any]:
       }
     }
     """
-    node_id = node.get('id', '')
-    lat_str = node.get('lat', '0.0')
-    lon_str = node.get('lon', '0.0')
-
-    lat = float(lat_str)
-    lon = float(lon_str)
+    # Read attributes straight from the element's attribute dict
+    attrib = node.attrib
+    lat = float(attrib.get('lat', '0.0'))
+    lon = float(attrib.get('lon', '0.0'))
 
     # Build properties from node attributes + <tag> children
     properties = {
-        "id": node_id,
+        "id": attrib.get('id', ''),
         "osm_type": "node",
         "lat": lat,
         "lon": lon
     }
 
-    for tag in node.findall('tag'):
-        k = tag.get('k')
-        v = tag.get('v')
+    # Iterate the children directly instead of findall('tag')
+    for tag in node:
+        if tag.tag != 'tag':
+            continue
+        tag_attrib = tag.attrib
+        k = tag_attrib.get('k')
+        v = tag_attrib.get('v')
         if k and v:
-            properties[k] = v
+            properties[_intern(k)] = v
 
     # Construct the final GeoJSON-like feature
     return {
@@ -72,11 +78,82 @@ def node_to_feature(node: ET.Element) -> Dict[str, Any]:
     }
 
 
-def convert_nodes_to_geojson(nodes: List[ET.Element]) -> List[Dict[str, Any]]:
+def element_to_feature(elem: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts a single Overpass JSON node element ({"type": "node", "id", "lat", "lon", "tags"})
+    into the same GeoJSON-like feature dict that node_to_feature produces.
+    """
+    lat = float(elem.get('lat', 0.0))
+    lon = float(elem.get('lon', 0.0))
+
+    properties = {
+        "id": str(elem.get('id', '')),
+        "osm_type": "node",
+        "lat": lat,
+        "lon": lon
+    }
+    for k, v in elem.get('tags', {}).items():
+        if k and v:
+            properties[_intern(k)] = v
+
+    return {
+        "type": "Feature",
+        "properties": properties,
+        "geometry": {
+            "type": "Point",
+            "coordinates": [lon, lat]
+        }
+    }
+
+
+def convert_elements_to_geojson(elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Converts Overpass JSON elements into GeoJSON-like features, keeping only nodes with at least one tag.
+    """
+    return [
+        element_to_feature(e)
+        for e in elements
+        if e.get('type') == 'node' and e.get('tags')
+    ]
+
+
+def iterparse_xml_features(tile_path: str) -> List[Dict[str, Any]]:
     """
-    Converts a list of valid <node> elements into a list of GeoJSON-like features.
+    Streams a legacy Overpass XML tile and converts each tagged <node> as soon as it has been parsed.
+    Processed elements are cleared right away, so the full DOM is never held in memory.
+    Raises ET.ParseError on malformed XML.
     """
-    return [node_to_feature(n) for n in nodes]
+    features = []
+    context = iter(ET.iterparse(tile_path, events=("start", "end")))
+    _, root = next(context)  # the first start event is <osm>; later start events are skipped
+    for event, elem in context:
+        if event != "end" or elem.tag != 'node':
+            continue
+        if elem.find('tag') is not None:
+            features.append(node_to_feature(elem))
+        # Nodes are direct children of <osm>; drop everything processed so far
+        elem.clear()
+        root.clear()
+    return features
+
+
+def load_tile_features(tile_path: str) -> List[Dict[str, Any]] | None:
+    """
+    Loads one Overpass tile (.json, or legacy .xml) as a list of GeoJSON-like features.
+    Returns None if the tile cannot be parsed.
+    """
+    if tile_path.endswith('.json'):
+        try:
+            return convert_elements_to_geojson(load_json(tile_path).get('elements', []))
+        except ValueError as e:
+            print(f"[ERROR] Failed to parse JSON for {tile_path}: {e}")
+            return None
+
+    try:
+        return iterparse_xml_features(tile_path)
+    except ET.ParseError as e:
+        print(f"[ERROR] Failed to parse XML for {tile_path}: {e}")
+        return None
 
 
 def filter_features(features: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int, int]:
@@ -96,16 +173,12 @@ def filter_features(features: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]
         props = feat.get("properties", {})
 
         # Check lat/lon
-        lat = props.get("lat")
-        lon = props.get("lon")
-        if lat is None or lon is None:
+        if props.get("lat") is None or props.get("lon") is None:
             discard_missing_geometry += 1
             continue
 
-        # Check if POI has any meaningful tags
-        skip_keys = ("id", "osm_type", "lat", "lon", "created_by")
-        tag_keys = [k for k in props if k not in skip_keys]
-        if not tag_keys:
+        # Check if POI has any meaningful tags (set-view subset test, no per-key Python loop)
+        if props.keys() <= _SKIP_KEYS:
             discard_no_tags += 1
             continue
 
@@ -117,36 +190,69 @@ def filter_features(features: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]
 # -----------------------------------------------------------------------------
 # Main Tile Processing Logic
 # -----------------------------------------------------------------------------
+# Tiles named by grid position (tile_<n>), written before tiles were named by query hash
+_LEGACY_TILE_NAME = re.compile(r"tile_\d+")
+
+
+def split_legacy_tiles(paths: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Returns (kept, dropped) for tile files (raw or preprocessed) named tile_<n> or tile_<hash>.
+    Legacy position-named tiles cover the same area as the hash-named ones, so if any hash-named tile is present,
+    all legacy tiles are dropped; otherwise everything is kept (an old cache still works on its own).
+    """
+    legacy = [p for p in paths if _LEGACY_TILE_NAME.fullmatch(os.path.splitext(os.path.basename(p))[0])]
+    if not legacy or len(legacy) == len(paths):
+        return list(paths), []
+    legacy_set = set(legacy)
+    return [p for p in paths if p not in legacy_set], legacy
+
+
+def preprocessed_path(tile_path: str, output_folder: str) -> str:
+    """
+    Returns the path process_single_tile writes for 'tile_path': <output_folder>/<tile_basename>.json.
+    """
+    tile_name = os.path.splitext(os.path.basename(tile_path))[0]
+    return os.path.join(output_folder, f"{tile_name}.json")
+
+
 def process_single_tile(
     tile_path: str,
-    output_folder: str = "data/preprocessed_tiles"
+    output_folder: str = "data/preprocessed_tiles",
+    force: bool = False,
+    pretty: bool = False
 ) -> Tuple[int, int]:
     """
-    Reads one tile XML file from 'tile_path', filters & converts nodes to JSON, discarding those missing geometry or with no meaningful tags, 
-    then writes the output to <output_folder>/<tile_basename>.json.
-    Returns: (discarded_missing_geo, discarded_no_tags) for this tile.
+    Reads one Overpass tile (.json, or legacy .xml) from 'tile_path', filters & converts nodes to JSON, discarding those missing geometry or with no meaningful tags, 
+    then writes the output to <output_folder>/<tile_basename>.json (compact unless 'pretty' is set). 'output_folder' must already exist.
+    The tile is skipped if its output is newer than the tile itself (unless 'force' is set), and nothing is written if no feature survives filtering.
+    Returns: (discarded_missing_geo, discarded_no_tags) for this tile; (0, 0) if it was skipped.
     """
-    # Load the XML tree
-    try:
-        tree = ET.parse(tile_path)
-    except ET.ParseError as e:
-        print(f"[ERROR] Failed to parse XML for {tile_path}: {e}")
+    output_json = preprocessed_path(tile_path, output_folder)
+
+    # Reuse the existing output if it was written after the tile was fetched
+    if not force:
+        try:
+            if os.stat(output_json).st_mtime >= os.stat(tile_path).st_mtime:
+                print(f"[INFO] Up to date: {output_json}")
+                return (0, 0)
+        except FileNotFoundError:
+            pass
+
+    # Convert to GeoJSON-like features (JSON tiles skip the XML tree walk)
+    geojson_data = load_tile_features(tile_path)
+    if geojson_data is None:
         return (0, 0)  # or skip
-    root = tree.getroot()
-
-    # Convert to GeoJSON-like features
-    valid_nodes    = remove_empty_nodes(root)
-    geojson_data   = convert_nodes_to_geojson(valid_nodes)
     filtered_data, n_miss, n_tags = filter_features(geojson_data)
 
-    # Prepare output path
-    tile_name    = os.path.splitext(os.path.basename(tile_path))[0]
-    os.makedirs(output_folder, exist_ok=True)
-    output_json  = os.path.join(output_folder, f"{tile_name}.json")
+    if not filtered_data:
+        # Nothing to save; drop a stale output from an earlier run so it is not picked up
+        if os.path.exists(output_json):
+            os.remove(output_json)
+        print(f"[INFO] Processed {tile_path} -> no features left after filtering; nothing written.")
+        return (n_miss, n_tags)
 
     # Save the resulting JSON
-    with open(output_json, 'w', encoding='utf-8') as f:
-        json.dump(filtered_data, f, indent=2, ensure_ascii=False)
+    dump_json(filtered_data, output_json, indent=pretty)
 
     print(f"[INFO] Processed {tile_path} -> {output_json}")
     print(f"       -> {len(geojson_data)} features before filtering; {len(filtered_data)} after filtering.")
@@ -156,10 +262,19 @@ def process_single_tile(
 
 def preprocess_all_tiles(
     input_folder: str = "data/overpass_cache",
-    output_folder: str = "data/preprocessed_tiles"
-) -> None:
+    output_folder: str = "data/preprocessed_tiles",
+    tile_paths: List[str] | None = None,
+    workers: int | None = None,
+    force: bool = False,
+    pretty: bool = False
+) -> List[str]:
     """
-    Loops over all *.xml files in 'input_folder', processes them, and saves JSON in 'output_folder'. Prints a summary of how many features were discarded (missing geometry, no tags).
+    Loops over all tile files (*.json, plus legacy *.xml) in 'input_folder', processes them, and saves JSON in 'output_folder'. Prints a summary of how many features were discarded (missing geometry, no tags).
+    If 'tile_paths' is given, only those tiles are processed instead of everything in 'input_folder'.
+    Tiles are independent and processed in parallel on up to 'workers' processes (default: all cores).
+    Tiles whose JSON is already newer than the tile are not reprocessed unless 'force' is set;
+    the discard summary only counts tiles processed in this run. Output is compact JSON unless 'pretty' is set.
+    Returns the paths of the JSON files for the processed tiles (written now or up to date).
     """
     script_dir   = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.abspath(os.path.join(script_dir, os.pardir, os.pardir))
@@ -172,29 +287,58 @@ def preprocess_all_tiles(
 
     os.makedirs(output_folder, exist_ok=True)
 
-    print(f"[INFO] Looking for XML in: {input_folder}")
+    print(f"[INFO] Looking for tiles in: {input_folder}")
     print(f"[INFO] Writing JSON to:    {output_folder}")
 
-    pattern    = os.path.join(input_folder, "*.xml")
-    tile_files = glob.glob(pattern)
+    if tile_paths is not None:
+        tile_files = list(tile_paths)
+    else:
+        # One file per tile name; a .json tile supersedes an .xml one of the same name
+        # (one os.scandir pass instead of a glob per extension)
+        tiles_by_name: Dict[str, str] = {}
+        if os.path.isdir(input_folder):
+            with os.scandir(input_folder) as entries:
+                for entry in entries:
+                    name, ext = os.path.splitext(entry.name)
+                    if ext not in (".json", ".xml") or name.startswith(".") or not entry.is_file():
+                        continue
+                    if ext == ".json" or name not in tiles_by_name:
+                        tiles_by_name[name] = entry.path
+        tile_files, legacy_files = split_legacy_tiles(list(tiles_by_name.values()))
+        if legacy_files:
+            print(f"[WARN] Ignoring {len(legacy_files)} legacy tile_<n> files in {input_folder} (superseded by hash-named tiles); delete them to silence this.")
     if not tile_files:
-        print(f"[WARN] No .xml files found in: {input_folder}")
-        return
+        print(f"[WARN] No .json/.xml tile files found in: {input_folder}")
+        return []
 
     total_missing_geo = 0
     total_no_tags     = 0
-
-    # Process each tile file
-    for tile_path in tile_files:
-        n_miss, n_tags = process_single_tile(tile_path, output_folder=output_folder)
-        total_missing_geo += n_miss
-        total_no_tags     += n_tags
+    output_files      = []
+
+    # Process the tile files in parallel; each writes its own JSON
+    n_workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(tile_files) // (4 * n_workers))
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        results = executor.map(
+            partial(process_single_tile, output_folder=output_folder, force=force, pretty=pretty),
+            tile_files,
+            chunksize=chunksize
+        )
+        for tile_path, (n_miss, n_tags) in zip(tile_files, results):
+            total_missing_geo += n_miss
+            total_no_tags     += n_tags
+
+            output_json = preprocessed_path(tile_path, output_folder)
+            if os.path.exists(output_json):  # unparseable or empty tiles write nothing
+                output_files.append(output_json)
 
     # Print summary of discards
     print(f"[INFO] Finished preprocessing all tiles.")
     print(f"[INFO] Discarded {total_missing_geo} features missing geometry.")
     print(f"[INFO] Discarded {total_no_tags} features with no meaningful tags.")
 
+    return output_files
+
 
 # -----------------------------------------------------------------------------
 # Command-Line Entrypoint
@@ -204,13 +348,13 @@ if __name__ == "__main__":
     import sys
 
     parser = argparse.ArgumentParser(
-        description="Preprocess Overpass XML tiles into filtered GeoJSON-like features."
+        description="Preprocess Overpass tiles (JSON or XML) into filtered GeoJSON-like features."
     )
     parser.add_argument(
         "--input_folder", 
         type=str, 
         default="data/overpass_cache",
-        help="Folder containing .xml tiles from Overpass API"
+        help="Folder containing .json/.xml tiles from Overpass API"
     )
     parser.add_argument(
         "--output_folder", 
@@ -218,12 +362,31 @@ if __name__ == "__main__":
         default="data/preprocessed_tiles",
         help="Folder to write the resulting JSON files"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of tile-processing worker processes (default: all CPU cores)"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reprocess every tile, even if its JSON output is newer than the tile"
+    )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Write indented JSON instead of compact output (combine with --force to rewrite existing files)"
+    )
 
     args = parser.parse_args()
 
     preprocess_all_tiles(
         input_folder=args.input_folder, 
-        output_folder=args.output_folder
+        output_folder=args.output_folder,
+        workers=args.workers,
+        force=args.force,
+        pretty=args.pretty
     )
 
     sys.exit(0)
@@ -1,19 +1,25 @@
-import json
+import math
+import os
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, BinaryIO, Deque, Optional, Tuple
+
+from json_io import load_json, dump_json, encode_json
 
 # -----------------------------------------------------------------------------
 # Tree Settings
 # -----------------------------------------------------------------------------
 MAX_DEPTH = 6      # Maximum depth levels for splitting
 MAX_PER_NODE = 25  # Maximum number of POIs per leaf before splitting
+KM_PER_DEG_LAT = 111.32  # Approximate length of one degree of latitude
 
 
 # -----------------------------------------------------------------------------
 # Quad: geographic bounding box
 # -----------------------------------------------------------------------------
-@dataclass
+@dataclass(slots=True)
 class Quad:
     """
     Represents a geographic bounding box by its south, west, north, and east edges.
@@ -43,6 +49,16 @@ class Quad:
         lon, lat = feature["geometry"]["coordinates"]
         return (self.south <= lat <= self.north) and (self.west <= lon <= self.east)
 
+    def size_km(self) -> float:
+        """
+        Approximate edge length in km: mean of the north-south and east-west extents
+        (the latter measured at the box's middle latitude).
+        """
+        height = (self.north - self.south) * KM_PER_DEG_LAT
+        mid_lat = math.radians((self.south + self.north) / 2.0)
+        width = (self.east - self.west) * KM_PER_DEG_LAT * math.cos(mid_lat)
+        return (height + width) / 2.0
+
     @staticmethod
     def from_tuple(t: Tuple[float, float, float, float]) -> "Quad":
         """
@@ -64,6 +80,8 @@ class QuadtreeNode:
     A node in the quadtree. If it's a leaf, it holds a list of features. Otherwise, it has children that further subdivide the bounding box.
     """
 
+    __slots__ = ("bbox", "data", "children", "poiCount", "_sum_lon", "_sum_lat", "chunkSizeKm")
+
     def __init__(self, bbox: Quad):
         self.bbox = bbox
         # Data if this node is a leaf; otherwise empty if subdivided
@@ -71,55 +89,28 @@ class QuadtreeNode:
         # Children if the node is split
         self.children: List["QuadtreeNode"] = []
 
-        # Summary attributes
+        # Summary attributes; coordinate sums roll up into the parent by plain addition
         self.poiCount: int = 0
-        self.averagePosition: Optional[Tuple[float, float]] = None
-
-    def _compute_average_position(self) -> None:
-        """
-        Compute the average position of this node's features.
-        - Leaf nodes: average of their own features.
-        - Non-leaf nodes: weighted average of children's average positions.
-        """
-        # Recurse into children first
-        for child in self.children:
-            child._compute_average_position()
-
-        if not self.children:
-            # Leaf node: direct average of features
-            n = len(self.data)
-            if n > 0:
-                sum_lon = sum(f["geometry"]["coordinates"][0] for f in self.data)
-                sum_lat = sum(f["geometry"]["coordinates"][1] for f in self.data)
-                self.averagePosition = (sum_lon / n, sum_lat / n)
-                self.poiCount = n
-        else:
-            # Internal node: weighted average of children's average positions
-            total = 0
-            sum_lon = 0.0
-            sum_lat = 0.0
-            for c in self.children:
-                # Each child might have 0 if it didn't have any data
-                if c.averagePosition and c.poiCount > 0:
-                    lon, lat = c.averagePosition
-                    sum_lon += lon * c.poiCount
-                    sum_lat += lat * c.poiCount
-                    total += c.poiCount
-            self.poiCount = total
-            if total > 0:
-                self.averagePosition = (sum_lon / total, sum_lat / total)
+        self._sum_lon: float = 0.0
+        self._sum_lat: float = 0.0
+        self.chunkSizeKm: float = bbox.size_km()
+
+    @property
+    def averagePosition(self) -> Optional[Tuple[float, float]]:
+        """
+        Mean (lon, lat) of all POIs below this node, or None if it holds none.
+        """
+        if self.poiCount > 0:
+            return (self._sum_lon / self.poiCount, self._sum_lat / self.poiCount)
+        return None
 
     def to_dict(self) -> Dict[str, Any]:
         """
         Convert this node (and its children) to a serializable dictionary.
+        'bbox' is emitted as a [south, west, north, east] array.
         """
         return {
-            "bbox": {
-                "south": self.bbox.south,
-                "west":  self.bbox.west,
-                "north": self.bbox.north,
-                "east":  self.bbox.east,
-            },
+            "bbox":            self.bbox.to_tuple(),
             "poiCount":        self.poiCount,
             "leafCount":       len(self.data),
             "averagePosition": self.averagePosition,
@@ -127,6 +118,27 @@ class QuadtreeNode:
             "children":        [c.to_dict() for c in self.children],
         }
 
+    def dump_json(self, fp: BinaryIO) -> None:
+        """
+        Stream this node (and its children) as compact JSON to the binary file 'fp'.
+        Produces the same document as to_dict(), but node by node: no intermediate dict tree is built
+        and features are encoded straight from their original dicts.
+        """
+        header = encode_json({
+            "bbox":            self.bbox.to_tuple(),
+            "poiCount":        self.poiCount,
+            "leafCount":       len(self.data),
+            "averagePosition": self.averagePosition,
+            "data":            self.data,
+        })
+        # Reopen the encoded object (drop its closing brace) to append the children array
+        fp.write(header[:-1] + b',"children":[')
+        for i, child in enumerate(self.children):
+            if i:
+                fp.write(b",")
+            child.dump_json(fp)
+        fp.write(b"]}")
+
 
 # -----------------------------------------------------------------------------
 # Build the quadtree for a single category
@@ -138,48 +150,74 @@ def build_quadtree_for_category(
 ) -> QuadtreeNode:
     """
     Build a quadtree from 'features' within 'bbox', recursively splitting until we either reach MAX_DEPTH, or node has <= max_per_node features.
+    Coordinates are read once into parallel lon/lat lists; the recursion partitions index lists
+    into 'features' instead of re-reading each feature dict at every level.
+    Features outside 'bbox' are ignored; each remaining feature ends up in exactly one leaf.
+    Average positions are aggregated bottom-up from per-node coordinate sums in the same pass.
     """
+    coords = [f["geometry"]["coordinates"] for f in features]
+    lons = [c[0] for c in coords]
+    lats = [c[1] for c in coords]
 
-    def _build(feats: List[Dict[str, Any]], box: Quad, depth: int) -> QuadtreeNode:
+    def _build(idx: List[int], box: Quad, depth: int) -> QuadtreeNode:
+        """Build the subtree for 'idx'; the node's coordinate sums are filled in for the parent to add up."""
         node = QuadtreeNode(box)
-        node.data = feats
 
         # If we're at max depth or small enough, become a leaf
-        if depth >= MAX_DEPTH or len(feats) <= max_per_node:
-            node._compute_average_position()
-            return node
-
-        # Otherwise, subdivide
-        for sub_box in box.subdivide_into_quadrants():
-            bucket = [f for f in feats if sub_box.contains_feature(f)]
+        if depth >= MAX_DEPTH or len(idx) <= max_per_node:
+            return _leaf(node, idx)
+
+        # Otherwise, subdivide: one pass assigns each feature its quadrant index
+        # (bit 0 = east half, bit 1 = north half), matching subdivide_into_quadrants' order.
+        # Features on a mid line go to the northern/eastern quadrant.
+        mid_lat = (box.south + box.north) / 2.0
+        mid_lon = (box.west + box.east) / 2.0
+        buckets: List[List[int]] = [[], [], [], []]
+        appenders = [bucket.append for bucket in buckets]
+        for i in idx:
+            appenders[(lons[i] >= mid_lon) + 2 * (lats[i] >= mid_lat)](i)
+
+        for sub_box, bucket in zip(box.subdivide_into_quadrants(), buckets):
             if bucket:
                 child = _build(bucket, sub_box, depth + 1)
                 node.children.append(child)
+                node.poiCount += child.poiCount
+                node._sum_lon += child._sum_lon
+                node._sum_lat += child._sum_lat
 
-        # If we added children, clear the data from this node
+        # Internal nodes never hold data; only a split that produced no children falls back to a leaf
         if node.children:
-            node.data = []
-
-        # Compute final average for this node
-        node._compute_average_position()
+            return node
+        return _leaf(node, idx)
+
+    def _leaf(node: QuadtreeNode, idx: List[int]) -> QuadtreeNode:
+        """Attach the features of 'idx' to a leaf node and summarize them."""
+        node.data = [features[i] for i in idx]
+        node.poiCount = len(idx)
+        node._sum_lon = sum([lons[i] for i in idx])
+        node._sum_lat = sum([lats[i] for i in idx])
         return node
 
-    return _build(features, bbox, depth=0)
+    # Same test as Quad.contains_feature, but on the cached floats
+    south, west, north, east = bbox.to_tuple()
+    root_idx = [
+        i for i in range(len(features))
+        if south <= lats[i] <= north and west <= lons[i] <= east
+    ]
+    return _build(root_idx, bbox, depth=0)
 
 # -----------------------------------------------------------------------------
 # Compute per‐depth summary statistics for a finished quadtree
 # -----------------------------------------------------------------------------
 def compute_depth_stats(root: QuadtreeNode) -> Dict[int, Dict[str, float]]:
-    stats: Dict[int, Dict[str, float]] = {}
-    queue: List[Tuple[QuadtreeNode, int]] = [(root, 0)]
+    stats: Dict[int, Dict[str, float]] = defaultdict(
+        lambda: {"nodeCount": 0, "totalPois": 0, "sumChunkKm": 0.0}
+    )
+    queue: Deque[Tuple[QuadtreeNode, int]] = deque([(root, 0)])
 
     while queue:
-        node, depth = queue.pop(0)
-        entry = stats.setdefault(depth, {
-            "nodeCount": 0,
-            "totalPois": 0,
-            "sumChunkKm": 0.0,
-        })
+        node, depth = queue.popleft()
+        entry = stats[depth]
         entry["nodeCount"] += 1
         entry["totalPois"] += node.poiCount
         entry["sumChunkKm"] += node.chunkSizeKm
@@ -192,7 +230,45 @@ def compute_depth_stats(root: QuadtreeNode) -> Dict[int, Dict[str, float]]:
         e["avgChunkKm"] = e["sumChunkKm"] / e["nodeCount"] if e["nodeCount"] else 0.0
         del e["sumChunkKm"]
 
-    return stats
+    return dict(stats)
+
+
+# -----------------------------------------------------------------------------
+# Per-subcategory build (one worker task in the CLI)
+# -----------------------------------------------------------------------------
+def _process_subcat(
+    subcat: str,
+    input_dir: Path,
+    output_dir: Path,
+    bbox: Tuple[float, float, float, float],
+    pretty: bool = False
+) -> str:
+    """
+    Load <input_dir>/<subcat>.json, build its quadtree over 'bbox' and write <subcat>_quadtree.json and <subcat>_stats.json to 'output_dir'.
+    Module-level (and taking only picklable arguments) so it can run in a worker process. Returns a status line.
+    """
+    name = subcat.replace(' ', '_')
+    in_path = input_dir / f"{name}.json"
+    out_tree = output_dir / f"{name}_quadtree.json"
+    out_stats = output_dir / f"{name}_stats.json"
+
+    # Load the POIs (assume JSON is a single list of features)
+    features = load_json(str(in_path))
+
+    # Build quadtree
+    root = build_quadtree_for_category(features, Quad.from_tuple(bbox))
+
+    # Write quadtree to disk (streamed unless pretty-printing)
+    if pretty:
+        dump_json(root.to_dict(), str(out_tree))
+    else:
+        with open(out_tree, "wb") as f:
+            root.dump_json(f)
+
+    stats = compute_depth_stats(root)
+    dump_json(stats, str(out_stats), indent=pretty)
+
+    return f"Wrote {out_tree} and {out_stats}"
 
 
 # -----------------------------------------------------------------------------
@@ -220,29 +296,28 @@ if __name__ == "__main__":
         "--outputDir", type=Path, default=Path("public/data"),
         help="Where to write the quadtree JSON files."
     )
+    parser.add_argument(
+        "--pretty", action="store_true",
+        help="Write indented JSON instead of compact output."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of worker processes (default: all CPU cores, at most one per subcat)."
+    )
     args = parser.parse_args()
 
     subcats = [s.strip() for s in args.subcats.split(",")]
     args.outputDir.mkdir(parents=True, exist_ok=True)
-    master_bbox = Quad(*args.bbox)
-
-    for sc in subcats:
-        in_path = args.inputDir / f"{sc.replace(' ','_')}.json"
-        out_tree = args.outputDir / f"{sc.replace(' ','_')}_quadtree.json"
-        out_stats = args.outputDir / f"{sc.replace(' ','_')}_stats.json"
-
-        # Load the POIs (assume JSON is a single list of features)
-        features = json.loads(in_path.read_text())
-
-        # Build quadtree
-        root = build_quadtree_for_category(features, master_bbox)
-
-        # Write quadtree to disk
-        out_tree.write_text(json.dumps(root.to_dict(), ensure_ascii=False, indent=2))
-
-        stats = compute_depth_stats(root)
-        out_stats.write_text(json.dumps(stats, ensure_ascii=False, indent=2))
-
-        print(f"Wrote {out_tree} and {out_stats}")
+    bbox = tuple(args.bbox)
+
+    # Subcategories are independent: build them in parallel, one process per subcat
+    n_workers = min(len(subcats), args.workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {
+            executor.submit(_process_subcat, sc, args.inputDir, args.outputDir, bbox, args.pretty): sc
+            for sc in subcats
+        }
+        for future in as_completed(futures):
+            print(future.result())
 
     sys.exit(0)
\ No newline at end of file